@@ -8,18 +8,40 @@ file to be imported into a Spreadsheet.
 
 # Standard imports
 import argparse
+import asyncio
 import csv
+import email.utils
+import logging
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
 # Dependency imports
+import aiohttp
+import orjson
 from tqdm import tqdm
-from oauthlib.oauth2 import BackendApplicationClient
+from tqdm.asyncio import tqdm_asyncio
+from oauthlib.oauth2 import BackendApplicationClient, TokenExpiredError
 from requests_oauthlib import OAuth2Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from requests.exceptions import RequestException
+from tenacity import (retry, retry_if_exception_type, retry_if_result,
+                      stop_after_attempt, wait_exponential, wait_random)
+from urllib3.util.retry import Retry
+
+# Messages are only formatted if the logging level lets them through
+log = logging.getLogger(__name__)
 
 # Help menu strings
 DESCRIPTION='''Dump the playlists for a given Spotify user.'''
+HELP_D='''CSV dialect of the output file, e.g. "excel-tab" for tab separated'''
 HELP_O='''Output file name'''
 HELP_S='''Spotify Client Secret'''
+HELP_T='''Download tracks with a pool of threads instead of asyncio. The
+access token is not refreshed, so very large accounts may fail part way.'''
 HELP_U='''Username for the Spotify account'''
 
 # OAuth Client Key for our "app"
@@ -29,6 +51,344 @@ API_CLIENT_ID = "b642673a942947c4b2b5c193bf4a0df4"
 SPOTIFY_BASE_URL='https://api.spotify.com/v1'
 SPOTIFY_TOKEN_URL='https://accounts.spotify.com/api/token'
 
+# Connection pool settings for requests to the Spotify API
+POOL_LIMIT = 20
+POOL_KEEPALIVE = 75
+
+# Client side throttling of requests to the Spotify API. Spotify doesn't
+# publish a fixed budget, so the steady rate is kept high and rejected
+# requests back off through `Retry-After`.
+RATE_LIMIT = 50
+RATE_CONCURRENCY = POOL_LIMIT
+
+# Retrying of failed requests to the Spotify API
+RETRY_LIMIT = 6
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF = wait_exponential(multiplier=0.5, max=30) + wait_random(0, 1)
+
+# Longest `Retry-After` delay, in seconds, waited out before giving up
+RETRY_AFTER_LIMIT = 60
+
+# Tracks already parsed, by Spotify ID, shared between all playlists
+TRACK_CACHE = dict()
+
+# Size of the write buffer for the output file
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Number of seconds before expiry at which the access token is refreshed
+TOKEN_REFRESH_MARGIN = 60
+
+@dataclass
+class TokenState:
+    """Access token shared by all asynchronous requests
+
+    The token is fetched again shortly before it expires. Only one refresh
+    happens per expiry, however many requests are waiting on it.
+
+    Attributes
+    ----------
+    oauth : OAuth2Session
+        Authenticated session used to fetch new tokens
+    secret : str
+        Client Secret for the developer account
+    access_token : str
+        Current bearer token
+    expires_at : float
+        Time, in seconds since the epoch, at which the token expires
+    lock : asyncio.Lock
+        Lock held while the token is being refreshed, created on first use so
+        that it belongs to the running event loop
+    """
+    oauth: OAuth2Session
+    secret: str = field(repr=False)
+    access_token: str = field(default=None, repr=False)
+    expires_at: float = 0
+    lock: asyncio.Lock = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.oauth.token:
+            self.access_token = self.oauth.token['access_token']
+            self.expires_at = self.oauth.token['expires_at']
+
+    async def get_access_token(self) -> str:
+        """Return a bearer token that is not about to expire"""
+        if time.time() > self.expires_at - TOKEN_REFRESH_MARGIN:
+            if self.lock is None:
+                self.lock = asyncio.Lock()
+
+            async with self.lock:
+                # The token may have been refreshed while waiting on the lock.
+                if time.time() > self.expires_at - TOKEN_REFRESH_MARGIN:
+                    await asyncio.to_thread(self.refresh)
+
+        return self.access_token
+
+    def refresh(self):
+        """Fetch a new token using the client credentials"""
+        auth = HTTPBasicAuth(API_CLIENT_ID, self.secret)
+        token = self.oauth.fetch_token(token_url=SPOTIFY_TOKEN_URL, auth=auth)
+
+        self.access_token = token['access_token']
+        self.expires_at = token['expires_at']
+
+
+class LeakyBucket(object):
+    """Leaky bucket rate limiter
+
+    Limits both the number of requests in flight and the rate at which new
+    requests are started. A background task leaks a token into the bucket
+    every `1 / rate_per_sec` seconds, and every request has to take a token
+    before it is sent.
+
+    Attributes
+    ----------
+    max_concurrent : int
+        Maximum number of requests in flight at once
+    rate_per_sec : float
+        Number of requests allowed to start per second
+    """
+    def __init__(self, rate_per_sec: float = RATE_LIMIT,
+                 max_concurrent: int = RATE_CONCURRENCY):
+        self.max_concurrent = max_concurrent
+        self.rate_per_sec = rate_per_sec
+
+        self.__semaphore = asyncio.Semaphore(max_concurrent)
+        self.__tokens = asyncio.Queue(maxsize=max_concurrent)
+        self.__resume = 0
+        self.__task = None
+
+    async def __aenter__(self):
+        await self.__semaphore.acquire()
+
+        try:
+            await self.__tokens.get()
+        except BaseException:
+            self.__semaphore.release()
+            raise
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.__semaphore.release()
+
+    def start(self):
+        """Start leaking tokens into the bucket"""
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__leak())
+
+    async def stop(self):
+        """Stop leaking tokens into the bucket"""
+        if self.__task is not None:
+            self.__task.cancel()
+
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    def backoff(self, delay: float):
+        """Hold back every request for `delay` seconds
+
+        Parameters
+        ----------
+        delay : float
+            Number of seconds to wait before any further request is sent
+        """
+        loop = asyncio.get_running_loop()
+        self.__resume = max(self.__resume, loop.time() + delay)
+
+        # Throw away any tokens that have already been leaked.
+        while not self.__tokens.empty():
+            self.__tokens.get_nowait()
+
+    async def __leak(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            delay = self.__resume - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            await self.__tokens.put(None)
+
+            # A backoff may have started while waiting for room in the bucket,
+            # in which case the token just leaked has to be taken back.
+            if self.__resume > loop.time():
+                self.__tokens.get_nowait()
+                continue
+
+            await asyncio.sleep(1 / self.rate_per_sec)
+
+
+def _is_retryable(response: aiohttp.ClientResponse) -> bool:
+    return response.status in RETRY_STATUSES
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> float:
+    # Number of seconds the `Retry-After` header asks to wait, given either as
+    # seconds or as an HTTP date, or `None` if there is no usable value.
+    value = response.headers.get('Retry-After')
+
+    if value is None:
+        return None
+
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    if math.isnan(delay):
+        return None
+
+    return max(delay, 0)
+
+
+def _wait_retry_after(retry_state) -> float:
+    # Wait as long as Spotify asks for with the `Retry-After` header, falling
+    # back to an exponential backoff when there is none.
+    if not retry_state.outcome.failed:
+        delay = _retry_after(retry_state.outcome.result())
+
+        if delay is not None:
+            return min(delay, RETRY_AFTER_LIMIT)
+
+    return RETRY_BACKOFF(retry_state)
+
+
+def _retry_after_too_long(retry_state) -> bool:
+    # Give up rather than silently sleep for as long as Spotify asks for when
+    # it throttles the app for a long time.
+    if retry_state.outcome.failed:
+        return False
+
+    delay = _retry_after(retry_state.outcome.result())
+
+    return delay is not None and delay > RETRY_AFTER_LIMIT
+
+
+class SpotifyClient(object):
+    """Asynchronous client for the Spotify API
+
+    All requests share a single pool of keep-alive connections, are
+    authorized with a bearer token that is kept fresh and are throttled by a
+    LeakyBucket.
+
+    Attributes
+    ----------
+    limiter : LeakyBucket
+        Rate limiter every request goes through
+    session : aiohttp.ClientSession
+        Client session used to make the requests
+    token : TokenState
+        Access token the requests are authorized with
+    """
+    def __init__(self, token: TokenState, limiter: LeakyBucket = None):
+        self.limiter = limiter if limiter is not None else LeakyBucket()
+        self.session = None
+        self.token = token
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT,
+                                         limit_per_host=POOL_LIMIT,
+                                         keepalive_timeout=POOL_KEEPALIVE)
+
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.limiter.start()
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.limiter.stop()
+        await self.session.close()
+
+    async def get(self, url: str, params: dict = None) -> dict:
+        """Send a GET request to the Spotify API
+
+        Requests that fail with a connection error, a timeout, HTTP 429 or a
+        server error are retried with an exponential backoff, or once the
+        delay given by the `Retry-After` header has passed.
+
+        Parameters
+        ----------
+        url : str
+            URL to request
+        params : dict
+            Query parameters for the request
+
+        Returns
+        -------
+        dict
+            The decoded JSON response, or `None` if the request failed.
+        """
+        try:
+            response = await self.__request(url, params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.error("[!] Request failed after %d attempts: %r", RETRY_LIMIT, e)
+            return None
+
+        if response.status != 200:
+            log.error("[!] Request failed with HTTP status code %d", response.status)
+            return None
+
+        try:
+            return await response.json(loads=orjson.loads)
+        except (aiohttp.ContentTypeError, orjson.JSONDecodeError) as e:
+            log.error("[!] Response could not be decoded as JSON: %r", e)
+            return None
+
+    async def authed_get(self, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """Send a GET request authorized with an unexpired bearer token
+
+        Parameters
+        ----------
+        url : str
+            URL to request
+        **kwargs
+            Additional arguments for `aiohttp.ClientSession.get`
+
+        Returns
+        -------
+        aiohttp.ClientResponse
+            The response to the request, which has to be released by the
+            caller.
+        """
+        access_token = await self.token.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        return await self.session.get(url, headers=headers, **kwargs)
+
+    @retry(retry=(retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError))
+                  | retry_if_result(_is_retryable)),
+           wait=_wait_retry_after,
+           stop=stop_after_attempt(RETRY_LIMIT) | _retry_after_too_long,
+           retry_error_callback=lambda retry_state: retry_state.outcome.result())
+    async def __request(self, url: str, params: dict) -> aiohttp.ClientResponse:
+        async with self.limiter:
+            async with await self.authed_get(url, params=params) as response:
+                # Read the body before the connection goes back to the pool.
+                await response.read()
+
+        if response.status == 429:
+            delay = _retry_after(response)
+
+            if delay is None:
+                delay = 1
+
+            if delay > RETRY_AFTER_LIMIT:
+                log.error("[!] Rate limited by Spotify for %.0f seconds, giving up", delay)
+            else:
+                # Every request is held back, not just this one, since they
+                # all count against the same budget.
+                self.limiter.backoff(delay)
+
+        return response
+
+
 class Playlist(object):
     """Playlist Class
 
@@ -53,6 +413,9 @@ class Playlist(object):
     uri : str
         URI to query for information directly
     """
+    __slots__ = ('description', 'name', 'owner', 'tracks', 'tracks_size',
+                 'tracks_uri', 'uri')
+
     def __init__(self, data: dict):
         """Parse the data object containing playlist attributes
 
@@ -63,21 +426,20 @@ class Playlist(object):
             Dictionary containing attributes of a playlist
         """
         # Check that the JSON we are about to parse is of type "playlist"
-        if 'type' not in data.keys():
-            if data['type'] != 'playlist':
-                raise Exception("data is not of type \"playlist\"")
+        if data.get('type') != 'playlist':
+            raise Exception("data is not of type \"playlist\"")
 
         # Parse out the relevant attributes
-        if 'description' in data.keys():
+        if 'description' in data:
             self.description = data['description']
-        if 'name' in data.keys():
+        if 'name' in data:
             self.name = data['name']
-        if 'owner' in data.keys():
+        if 'owner' in data:
             self.owner = data['owner']
-        if 'tracks' in data.keys():
+        if 'tracks' in data:
             self.tracks_size = data['tracks']['total']
             self.tracks_uri = data['tracks']['href']
-        if 'href' in data.keys():
+        if 'href' in data:
             self.uri = data['href']
         
         # Initialize the track listing
@@ -104,28 +466,67 @@ class Playlist(object):
             A boolean value. `True` if all tracks have been successfully
             retrieved; `False` otherwise.
         """
+        # Empty playlists have nothing to download.
+        if self.tracks_size == 0:
+            return True
+
         ret = False
 
         if session is not None:
-            downloaded = self.__download_tracks(session)
+            try:
+                downloaded = self.__download_tracks(session)
+            except (RequestException, TokenExpiredError) as e:
+                log.error("[!] Error downloading %s tracks: %r", self.name, e)
+                downloaded = None
 
             if downloaded is not None:
-                for track in downloaded:
-                    self.tracks.append(Track(track))
+                # Only keep the tracks once all of them have been parsed, so a
+                # failure doesn't leave the playlist half filled.
+                self.tracks = [Track.from_payload(track) for track in downloaded]
                 ret = True
         else:
-            print(f"[!] OAuth2Session object is `None`")
+            log.error("[!] OAuth2Session object is `None`")
 
 
         return ret
 
+    async def get_tracks_async(self, client: SpotifyClient):
+        """For this playlist, retrieve all track information asynchronously
+
+        Parameters
+        ----------
+        client : SpotifyClient
+            Client to use for querying for the tracks for this playlist.
+
+        Returns
+        -------
+        bool
+            A boolean value. `True` if all tracks have been successfully
+            retrieved; `False` otherwise.
+        """
+        # Empty playlists have nothing to download.
+        if self.tracks_size == 0:
+            return True
+
+        ret = False
+
+        if client is not None:
+            downloaded = await self.__download_tracks_async(client)
+
+            if downloaded is not None:
+                # Only keep the tracks once all of them have been parsed, so a
+                # failure doesn't leave the playlist half filled.
+                self.tracks = [Track.from_payload(track) for track in downloaded]
+                ret = True
+        else:
+            log.error("[!] SpotifyClient object is `None`")
+
+        return ret
+
     def write_csv(self, writer):
         writer.writerow([self.name]) 
         writer.writerow(["Track", "Album", "Artist", "Spotify URL"])
-
-        for track in self.tracks:
-            row = [track.name, track.album, track.artist, track.spotify_url]
-            writer.writerow(row)
+        writer.writerows([(t.name, t.album, t.artist, t.spotify_url) for t in self.tracks])
 
         writer.writerow(["-"] * 4)
     
@@ -142,19 +543,40 @@ class Playlist(object):
             response = session.get(self.tracks_uri, params=query)
 
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
 
-                if 'items' in data.keys():
-                    dlist += data['items']
+                if 'items' in data:
+                    dlist.extend(data['items'])
                     index += len(data['items'])
             else:
-                print(f"[!] Error downloading {self.name} tracks, stopping download")
+                log.error("[!] Error downloading %s tracks, stopping download", self.name)
                 index = self.tracks_size + 1
         # End while-loop
 
         # Check that all tracks for the playlist have been downloaded.
         if len(dlist) != self.tracks_size:
-            print(f"[!] Failed to retrieve all tracks in response")
+            log.error("[!] Failed to retrieve all tracks in response")
+            dlist = None
+
+        return dlist
+
+    async def __download_tracks_async(self, client: SpotifyClient) -> list:
+        # The total number of tracks is already known, so every page can be
+        # requested at once rather than waiting on each page in turn.
+        offsets = range(0, self.tracks_size, 50)
+        queries = [{"limit" : 50, "offset" : o} for o in offsets]
+        pages = await asyncio.gather(*[client.get(self.tracks_uri, params=q) for q in queries])
+
+        # Pages are returned in offset order, keeping the track order intact.
+        if None in pages:
+            log.error("[!] Error downloading %s tracks", self.name)
+            dlist = list()
+        else:
+            dlist = [item for data in pages for item in data.get('items', ())]
+
+        # Check that all tracks for the playlist have been downloaded.
+        if len(dlist) != self.tracks_size:
+            log.error("[!] Failed to retrieve all tracks in response")
             dlist = None
 
         return dlist
@@ -172,11 +594,11 @@ class Track(object):
         Name of the track
     spotify_url : str
         Spotify URL for the track
-    track : dict
-        Raw dictionary for the track
     track_number : int
         Track number on the album
     """
+    __slots__ = ('album', 'artist', 'name', 'spotify_url', 'track_number')
+
     def __init__(self, data):
         """Parse the data object containing playlist attributes
 
@@ -186,32 +608,61 @@ class Track(object):
         data : dict
             Dictionary containing attributes of a track
         """
-        # Pretty much only care about `track` within the data provided.
-        if 'track' in data.keys():
-            self.track = data['track']
+        # Pretty much only care about `track` within the data provided. It is
+        # only kept locally so the raw dictionary can be freed once parsed.
+        if 'track' in data:
+            track = data['track']
         else:
             raise Exception("Invalid track dictionary for initialization")
 
         # Check that the JSON we are about to parse is of type "track"
-        if self.track['type'] != 'track':
+        if not track:
             raise Exception("data is not of type \"track\"")
-        if not data['track']:
+        if track['type'] != 'track':
             raise Exception("data is not of type \"track\"")
 
 
-        if 'album' in self.track.keys():
-            self.album = self.track['album']['name']
-        if 'artists' in self.track.keys():
-            if len(self.track['artists']) > 0:
+        if 'album' in track:
+            self.album = track['album']['name']
+        if 'artists' in track:
+            if len(track['artists']) > 0:
                 # If there are artists associated with this track we only
                 # care about the first.
-                artist = self.track['artists'][0]
+                artist = track['artists'][0]
                 self.artist = artist['name']
                 self.spotify_url = artist['external_urls']['spotify']
 
-        self.name = self.track['name']
-        self.track_number = self.track['track_number']
+        self.name = track['name']
+        self.track_number = track['track_number']
     
+    @classmethod
+    def from_payload(cls, data: dict):
+        """Get the Track for a playlist item, reusing it if already parsed
+
+        The same track often appears on several playlists, so every track is
+        only parsed once and then shared through `TRACK_CACHE`.
+
+        Parameters
+        ----------
+        data : dict
+            Dictionary containing attributes of a track
+
+        Returns
+        -------
+        Track
+            The Track object for the item.
+        """
+        track_id = (data.get('track') or {}).get('id')
+
+        if track_id is None:
+            # Local files have no Spotify ID to cache them by.
+            return cls(data)
+
+        if track_id not in TRACK_CACHE:
+            TRACK_CACHE[track_id] = cls(data)
+
+        return TRACK_CACHE[track_id]
+
     def __repr__(self):
         return f"[Track: {self.name} by {self.artist} ({self.album})"
 
@@ -239,6 +690,17 @@ def spotify_login(secret):
     # Spotify API.
     spotify = OAuth2Session(client=client)
 
+    # Keep a pool of connections alive so consecutive requests don't each pay
+    # for a new TCP and TLS handshake, and retry transient failures.
+    # The last response is still returned once retries run out, so that the
+    # status checks of the callers get to report it.
+    retries = Retry(total=3, backoff_factor=0.3,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=POOL_LIMIT, pool_maxsize=POOL_LIMIT,
+                          max_retries=retries)
+    spotify.mount("https://", adapter)
+
     # While the token isn't necessary for making requests through the OAuth2
     # session, this call needs to happen in order to establish an authenticated
     # session.
@@ -251,7 +713,8 @@ def spotify_get_playlists(oauth: OAuth2Session, user: str) -> list:
     """A function to get all playlists for a user.
     
     Using the given `spotify` object, retrieve all playlists associated with
-    the account.
+    the account. Playlists are returned by Spotify in pages of at most 50, so
+    pages are requested until there are none left.
 
     Parameters
     ----------
@@ -264,36 +727,179 @@ def spotify_get_playlists(oauth: OAuth2Session, user: str) -> list:
         List of spotify playlists for the given Spotify account.
     """
     playlists = list()
-    num_playlists = 0
+    index = 0
+
+    while True:
+        query = {"limit" : 50, "offset" : index}
+        response = oauth.get(SPOTIFY_BASE_URL + f'/users/{user}/playlists', params=query)
 
-    response = oauth.get(SPOTIFY_BASE_URL + f'/users/{user}/playlists')
+        if response.status_code != 200:
+            log.error("[!] Playlist request failed with HTTP status code %d", response.status_code)
+            break
 
-    if response.status_code == 200:
         # Extract the JSON object from the response.
-        data = response.json()
-        
-        # Check the number of playlists in the response against the "total" number
-        # expected.       
-        expected_size = data['total']
-        total_size = len(data['items'])
-
-        if expected_size == total_size:
-            for item in data['items']:
-                playlists.append(Playlist(item))
-            
-            print(f"[+] Found {len(playlists)} playlists")
-        else:
-            print(f"[!] Expected {expected_size} playlists, data contained {total_size}")
-    else:
-        print(f"[!] Playlist request failed with HTTP status code {response.status_code}")
+        data = orjson.loads(response.content)
+
+        for item in data['items']:
+            playlists.append(Playlist(item))
+
+        index += len(data['items'])
+
+        if data['next'] is None or len(data['items']) < 50:
+            break
+    # End while-loop
+
+    log.info("[+] Found %d playlists", len(playlists))
+
+    return playlists
+
+
+async def _get_playlists_async(client: SpotifyClient, user: str, on_page=None) -> list:
+    url = SPOTIFY_BASE_URL + f'/users/{user}/playlists'
+    playlists = list()
+
+    async def get_page(offset: int) -> tuple:
+        data = await client.get(url, params={"limit" : 50, "offset" : offset})
+
+        if data is None:
+            return 0, None
+
+        page = [Playlist(item) for item in data['items']]
+
+        # Let the caller get started on these playlists while the remaining
+        # pages are still being downloaded.
+        if on_page is not None:
+            on_page(page)
+
+        return data['total'], page
+
+    # The first page tells how many playlists there are, after which all the
+    # remaining pages can be requested at once.
+    total, page = await get_page(0)
+
+    if page is None:
+        log.error("[!] Playlist request failed")
+        return playlists
+
+    results = await asyncio.gather(*[get_page(o) for o in range(50, total, 50)])
+    pages = [page] + [p for _, p in results]
+
+    for page in pages:
+        if page is None:
+            log.error("[!] Failed to retrieve all playlists")
+            continue
+
+        playlists.extend(page)
+
+    log.info("[+] Found %d playlists", len(playlists))
+
+    return playlists
+
+
+async def _get_tracks_async(client: SpotifyClient, playlist: Playlist) -> bool:
+    # A failure in one playlist must not cancel the downloads of all the
+    # other playlists.
+    try:
+        return await playlist.get_tracks_async(client)
+    except Exception as e:
+        log.error("[!] Error downloading %s tracks: %r", playlist.name, e)
+        return False
+
+
+def _get_tracks_threaded(oauth: OAuth2Session, playlist: Playlist) -> bool:
+    # A failure in one playlist must not throw away the downloads of all the
+    # other playlists when the results are collected.
+    try:
+        return playlist.get_tracks(oauth)
+    except Exception as e:
+        log.error("[!] Error downloading %s tracks: %r", playlist.name, e)
+        return False
+
+
+def spotify_get_tracks_threaded(oauth: OAuth2Session, playlists: list) -> list:
+    """A function to download the tracks of every playlist using threads.
+
+    This is a fallback for the asynchronous download. `requests` releases the
+    GIL while waiting on the socket, so the threads overlap their requests.
+    The OAuth2 session is shared by all threads, and as many threads are used
+    as the asynchronous path allows requests in flight. Unlike that path, the
+    access token is not refreshed when it expires.
+
+    Parameters
+    ----------
+    oauth : OAuth2Session
+        Authenticated session to use for querying for the tracks.
+    playlists : list
+        List of Playlist objects to retrieve the tracks for.
+
+    Returns
+    -------
+    list
+        List of booleans, one per playlist that has tracks, indicating
+        whether all tracks were retrieved.
+    """
+    playlists = [p for p in playlists if len(p) > 0]
+
+    with ThreadPoolExecutor(max_workers=RATE_CONCURRENCY) as executor:
+        results = executor.map(lambda p: _get_tracks_threaded(oauth, p), playlists)
+
+        return list(tqdm(results, "[+] Downloading Playlists", total=len(playlists)))
+
+
+async def spotify_download(token: TokenState, user: str) -> list:
+    """A function to download all playlists and their tracks for a user.
+
+    All requests share a single SpotifyClient, which keeps them within the
+    Spotify rate limits. The tracks of each playlist start downloading as soon
+    as the page listing it arrives, rather than once all playlists are known.
+
+    Parameters
+    ----------
+    token : TokenState
+        Access token to authorize the requests with.
+    user : str
+        Username for the Spotify account.
+
+    Returns
+    -------
+    list
+        List of spotify playlists, with their tracks, for the given Spotify
+        account.
+    """
+    async with SpotifyClient(token) as client:
+        downloads = list()
+
+        def start_downloads(page: list):
+            for playlist in page:
+                # Skip empty playlists so they don't take up a slot in the
+                # rate limiter.
+                if len(playlist) > 0:
+                    task = asyncio.create_task(_get_tracks_async(client, playlist))
+                    downloads.append(task)
+
+        try:
+            playlists = await _get_playlists_async(client, user, on_page=start_downloads)
+
+            if len(downloads) > 0:
+                await tqdm_asyncio.gather(*downloads, desc="[+] Downloading Playlists")
+        finally:
+            # If anything above failed, stop the remaining downloads before
+            # the client closes the session they are using.
+            for task in downloads:
+                task.cancel()
+
+            await asyncio.gather(*downloads, return_exceptions=True)
 
     return playlists
 
 
 def get_arguments():
     parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument('-d', '--dialect', default='excel',
+                        choices=csv.list_dialects(), help=HELP_D)
     parser.add_argument('-o', '--output', help=HELP_O)
     parser.add_argument('-s', '--client-secret', help=HELP_S)
+    parser.add_argument('-t', '--threaded', action='store_true', help=HELP_T)
     parser.add_argument('-u', '--user', help=HELP_U)
     
     return parser.parse_args()
@@ -301,6 +907,8 @@ def get_arguments():
 
 def main():
     args = get_arguments()
+    logging.basicConfig(format="%(message)s", level=logging.INFO,
+                        stream=sys.stdout)
     playlists = None
     session = None
 
@@ -308,29 +916,35 @@ def main():
     session = spotify_login(args.client_secret)
 
     if session is None:
-        print(f"[!] Error acquiring Spotilist authorization token.")
+        log.error("[!] Error acquiring Spotilist authorization token.")
         return
 
-    print("[+] Spotilist session created to Spotify")
+    log.info("[+] Spotilist session created to Spotify")
 
-    # 2. Get all playlists that can be retrieved for the account.
-    playlists = spotify_get_playlists(session, args.user)
+    # 2. Get all playlists that can be retrieved for the account, and
+    # 3. retrieve all songs for each playlist found.
+    if args.threaded:
+        playlists = spotify_get_playlists(session, args.user)
+
+        if len(playlists) > 0:
+            spotify_get_tracks_threaded(session, playlists)
+    else:
+        token = TokenState(session, args.client_secret)
+        playlists = asyncio.run(spotify_download(token, args.user))
 
-    # 3. Retrieve all songs for each playlist found.
     if len(playlists) > 0:
-        for playlist in tqdm(playlists, "[+] Downloading Playlists"):
-            playlist.get_tracks(session)
-        
-        # Print resulting playlists
-        for playlist in playlists:
-            print(f"[+] Playlist: {playlist.name}, {len(playlist)} tracks")
+        # Print resulting playlists as a single message, only building it if
+        # it is going to be shown.
+        if log.isEnabledFor(logging.INFO):
+            log.info("\n".join("[+] Playlist: %s, %d tracks" % (p.name, len(p))
+                               for p in playlists))
     else:
-        print(f"[!] No playlists downloaded")
+        log.error("[!] No playlists downloaded")
         return
 
     # 4. Create a CSV formatted file to import into Excel
-    with open(args.output, "w") as f:
-        playlist_writer = csv.writer(f)
+    with open(args.output, "w", buffering=OUTPUT_BUFFER_SIZE) as f:
+        playlist_writer = csv.writer(f, dialect=args.dialect)
 
         for playlist in tqdm(playlists, f"[+] Writing playlists to {args.output}"):
             playlist.write_csv(playlist_writer)